@@ -1,3 +1,4 @@
+import numpy as np
 from typing import List
 from ReinLife.World.environment import Environment
 from ReinLife.Models.utils import BasicBrain
@@ -55,16 +56,24 @@ def tester(brains: List[BasicBrain],
     env.render(fps=fps)
 
     while True:
+
+        # Agents within a family share a brain which allows for a single forward pass per family
+        families = {}
         for agent in env.agents:
-            if env.static_families:
-                if env.brains[agent.gene].method in ["DQN", "D3QN", "PERD3QN"]:
-                    agent.action = agent.brain.get_action(agent.state, 0)
-                elif env.brains[agent.gene].method in ["PPO", "PERDQN"]:
-                    agent.action = agent.brain.get_action(agent.state)
-            else:
-                if agent.brain.method in ["DQN", "D3QN", "PERD3QN"]:
+            families.setdefault(agent.gene, []).append(agent)
+
+        for family in families.values():
+            brain = env.brains[family[0].gene] if env.static_families else family[0].brain
+
+            if brain.method == "PERD3QN":
+                actions = brain.get_actions_batch(np.stack([agent.state for agent in family]), brain.epsilon)
+                for agent, action in zip(family, actions):
+                    agent.action = action
+            elif brain.method in ["DQN", "D3QN"]:
+                for agent in family:
                     agent.action = agent.brain.get_action(agent.state, 0)
-                elif agent.brain.method in ["PPO", "PERDQN"]:
+            elif brain.method in ["PPO", "PERDQN"]:
+                for agent in family:
                     agent.action = agent.brain.get_action(agent.state)
 
         env.step()
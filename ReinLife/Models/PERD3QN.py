@@ -1,11 +1,16 @@
+import copy
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import numpy as np
-import random
 from typing import Any
 from .utils import BasicBrain
 
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
 
 class PERD3QNAgent(BasicBrain):
     """ Prioritized Experience Replay Dueling Double Deep Q Network
@@ -44,17 +49,31 @@ class PERD3QNAgent(BasicBrain):
 
     training : bool, default True,
         Whether to continue training or not
+
+    device : str, default "cpu"
+        The device on which the networks and the replay buffer are kept, for example "cuda"
+
+    seed : int, default None
+        Seed for the random number generator used for exploration and for sampling the replay buffer
     """
     def __init__(self, input_dim=153, output_dim=8, exploration=1000, soft_update_freq=200, train_freq=20,
-                 learning_rate=1e-3, batch_size=64, capacity=10000, gamma=0.99, load_model=False, training=True):
+                 learning_rate=1e-3, batch_size=64, capacity=10000, gamma=0.99, load_model=False, training=True,
+                 device="cpu", seed=None):
         super().__init__(input_dim, output_dim, "PERD3QN")
-        self.target_net = DuelingDDQN(input_dim, output_dim)
-        self.eval_net = DuelingDDQN(input_dim, output_dim)
-        self.eval_net.load_state_dict(self.target_net.state_dict())
+        self.device = device
+        self.rng = np.random.default_rng(seed)
+        self.target_net = DuelingDDQN(input_dim, output_dim).to(self.device)
+        self.eval_net = DuelingDDQN(input_dim, output_dim).to(self.device)
+        _hard_update(self.eval_net, self.target_net)
+        self.target_net.eval()
+        self.eval_net.eval()
         self.optimizer = torch.optim.Adam(self.eval_net.parameters(), lr=learning_rate)
-        self.buffer = PrioritizedReplayBuffer(capacity)
+        self.buffer = PrioritizedReplayBuffer(capacity, input_dim, device=self.device, rng=self.rng)
         self.loss_fn = nn.MSELoss()
 
+        # Reused input for single-state action selection; filled in place through a shared-memory numpy view
+        self._state_buf = torch.empty((1, input_dim), dtype=torch.float32)
+
         self.exploration = exploration
         self.soft_update_freq = soft_update_freq
         self.train_freq = train_freq
@@ -70,12 +89,10 @@ class PERD3QNAgent(BasicBrain):
             self.epsilon = 0
 
         if load_model:
-            self.eval_net.load_state_dict(torch.load(load_model))
-            self.eval_net.eval()
+            self.eval_net.load_state_dict(torch.load(load_model, map_location=self.device))
 
             if self.training:
-                self.target_net.load_state_dict(torch.load(load_model))
-                self.target_net.eval()
+                self.target_net.load_state_dict(torch.load(load_model, map_location=self.device))
                 self.optimizer = torch.optim.Adam(self.eval_net.parameters(), lr=learning_rate)
 
     def get_action(self, state, n_epi):
@@ -85,34 +102,62 @@ class PERD3QNAgent(BasicBrain):
                     self.epsilon = self.epsilon * self.decay
                 self.n_epi = n_epi
 
-        action = self.eval_net.act(torch.FloatTensor(np.expand_dims(state, 0)), self.epsilon)
+        self._state_buf.numpy()[0] = state
+        action = self.act(self._state_buf.to(self.device), self.epsilon)
         return action
 
+    def __deepcopy__(self, memo):
+        """ Deep copy the brain, but give the copy its own random stream instead of replaying the parent's """
+        copied = self.__class__.__new__(self.__class__)
+        memo[id(self)] = copied
+        for key, value in self.__dict__.items():
+            setattr(copied, key, copy.deepcopy(value, memo))
+        copied.rng = np.random.default_rng(self.rng.integers(2 ** 63))
+        copied.buffer.rng = copied.rng
+        return copied
+
+    def act(self, observation, epsilon):
+        """ Epsilon-greedy action selection using the random number generator of the brain """
+        if self.rng.random() < epsilon:
+            return int(self.rng.integers(self.output_dim))
+
+        with torch.no_grad():
+            q_value = self.eval_net.forward(observation)
+        return int(q_value.argmax(1).item())
+
+    def get_actions_batch(self, states, epsilon):
+        """ Epsilon-greedy actions for a stack of states using a single forward pass """
+        with torch.no_grad():
+            states = torch.from_numpy(np.asarray(states, dtype=np.float32)).to(self.device)
+            q_values = self.eval_net.forward(states)
+        actions = q_values.argmax(1).cpu().numpy()
+        explore = self.rng.random(len(actions)) < epsilon
+        actions[explore] = self.rng.integers(self.output_dim, size=int(explore.sum()))
+        return actions.tolist()
+
     def memorize(self, obs, action, reward, next_obs, done):
         self.buffer.store(obs, action, reward, next_obs, done)
 
     def train(self):
         observation, action, reward, next_observation, done, indices, weights = self.buffer.sample(self.batch_size)
 
-        observation = torch.FloatTensor(observation)
-        action = torch.LongTensor(action)
-        reward = torch.FloatTensor(reward)
-        next_observation = torch.FloatTensor(next_observation)
-        done = torch.FloatTensor(done)
-
+        # Both networks are kept in eval mode outside of training
+        self.eval_net.train()
         q_values = self.eval_net.forward(observation)
-        next_q_values = self.target_net.forward(next_observation)
-        next_q_value = next_q_values.max(1)[0].detach()
+        with torch.no_grad():
+            next_q_values = self.target_net.forward(next_observation)
+        next_q_value = next_q_values.max(1)[0]
         q_value = q_values.gather(1, action.unsqueeze(1)).squeeze(1)
         expected_q_value = reward + self.gamma * (1 - done) * next_q_value
 
         loss = self.loss_fn(q_value, expected_q_value)
-        priorities = torch.abs(next_q_value - q_value).detach().numpy()
+        priorities = torch.abs(next_q_value - q_value).detach().cpu().numpy()
         self.buffer.update_priorities(indices, priorities)
 
         self.optimizer.zero_grad()
         loss.backward()
         self.optimizer.step()
+        self.eval_net.eval()
 
     def learn(self, age, dead, action, state, reward, state_prime, done, n_epi):
         self.memorize(state, action, reward, state_prime, done)
@@ -122,64 +167,194 @@ class PERD3QNAgent(BasicBrain):
                 self.train()
 
             if n_epi % self.soft_update_freq == 0:
-                self.target_net.load_state_dict(self.eval_net.state_dict())
+                _hard_update(self.target_net, self.eval_net)
+
+    def apply_gaussian_noise(self, sigma=.5):
+        """ Mutate the brain by adding gaussian noise to its first layer
 
-    def apply_gaussian_noise(self):
+        The standard deviation of the noise is sigma times that of the weights of the layer,
+        so that a mutation perturbs a brain instead of replacing what it has learned.
+        """
         with torch.no_grad():
-            self.target_net.fc.weight.add_(torch.randn(self.target_net.fc.weight.size()))
-        self.target_net.load_state_dict(self.eval_net.state_dict())
+            weight = self.eval_net.fc.weight
+            weight.add_(torch.empty_like(weight).normal_(0, sigma * weight.std().item()))
+        _hard_update(self.target_net, self.eval_net)
+
+
+def _hard_update(target, source):
+    """ Copy the parameters of source into target in place """
+    with torch.no_grad():
+        for target_param, source_param in zip(target.parameters(), source.parameters()):
+            target_param.copy_(source_param)
 
 
 class PrioritizedReplayBuffer(object):
-    def __init__(self, capacity, alpha=.6, beta=.4, beta_increment=1000):
+    def __init__(self, capacity, input_dim, alpha=.6, beta=.4, beta_increment=1000, device="cpu", rng=None):
         self.capacity = capacity
+        self.device = device
+        self.rng = rng if rng is not None else np.random.default_rng()
         self.alpha = alpha
         self.beta = beta
         self.beta_increment = beta_increment
         self.pos = 0
-        self.memory = []
-        self.priorities = np.zeros([self.capacity], dtype=np.float32)
-
-    def store(self, observation, action, reward, next_observation, done):
-        observation = np.expand_dims(observation, 0)
-        next_observation = np.expand_dims(next_observation, 0)
+        self.size = 0
+
+        # Transitions are stored column-wise in preallocated arrays. On the cpu these are numpy arrays, which are
+        # much cheaper to write single transitions into, and sampled batches are wrapped with torch.from_numpy.
+        # On other devices (cuda) they are tensors on that device so that a sampled batch never leaves it.
+        # Only the priorities (sum-tree) are always kept on the cpu. Observations are kept in half precision
+        # to halve the memory that is read when gathering a batch, they are upcast once sampled.
+        self.on_cpu = torch.device(device).type == "cpu"
+        if self.on_cpu:
+            self.observation = np.empty((capacity, input_dim), dtype=np.float16)
+            self.action = np.empty(capacity, dtype=np.int64)
+            self.reward = np.empty(capacity, dtype=np.float32)
+            self.next_observation = np.empty((capacity, input_dim), dtype=np.float16)
+            self.done = np.empty(capacity, dtype=np.float32)
+        else:
+            self.observation = torch.empty((capacity, input_dim), dtype=torch.float16, device=device)
+            self.action = torch.empty(capacity, dtype=torch.int64, device=device)
+            self.reward = torch.empty(capacity, dtype=torch.float32, device=device)
+            self.next_observation = torch.empty((capacity, input_dim), dtype=torch.float16, device=device)
+            self.done = torch.empty(capacity, dtype=torch.float32, device=device)
 
-        max_prior = np.max(self.priorities) if self.memory else 1.0
+        self.tree = SumTree(capacity)
+        self.max_priority = 1.0
 
-        if len(self.memory) < self.capacity:
-            self.memory.append([observation, action, reward, next_observation, done])
+    def store(self, observation, action, reward, next_observation, done):
+        if self.on_cpu:
+            self.observation[self.pos] = observation
+            self.action[self.pos] = action
+            self.reward[self.pos] = reward
+            self.next_observation[self.pos] = next_observation
+            self.done[self.pos] = done
         else:
-            self.memory[self.pos] = [observation, action, reward, next_observation, done]
-        self.priorities[self.pos] = max_prior
+            self.observation[self.pos] = torch.as_tensor(observation)
+            self.action[self.pos] = int(action)
+            self.reward[self.pos] = float(reward)
+            self.next_observation[self.pos] = torch.as_tensor(next_observation)
+            self.done[self.pos] = float(done)
+
+        self.size = min(self.size + 1, self.capacity)
+        self.tree.update(self.pos + self.capacity - 1, self.max_priority ** self.alpha)
         self.pos += 1
         self.pos = self.pos % self.capacity
 
     def sample(self, batch_size):
-        if len(self.memory) < self.capacity:
-            probs = self.priorities[: len(self.memory)]
-        else:
-            probs = self.priorities
-        probs = probs ** self.alpha
-        probs = probs / np.sum(probs)
-
-        indices = np.random.choice(len(self.memory), batch_size, p=probs)
-        samples = [self.memory[idx] for idx in indices]
+        total = self.tree.total()
+        leaves = self.tree.get(self.rng.uniform(0, total, batch_size))
+        indices = np.minimum(leaves - (self.capacity - 1), self.size - 1)
 
-        weights = (len(self.memory) * probs[indices]) ** (- self.beta)
+        probs = self.tree.tree[indices + self.capacity - 1] / total
+        weights = (self.size * probs) ** (- self.beta)
         if self.beta < 1:
             self.beta += self.beta_increment
         weights = weights / np.max(weights)
         weights = np.array(weights, dtype=np.float32)
 
-        observation, action, reward, next_observation, done = zip(* samples)
-        return np.concatenate(observation, 0), action, reward, np.concatenate(next_observation, 0), done, indices, weights
+        if self.on_cpu:
+            return torch.from_numpy(self.observation[indices]).float(), \
+                torch.from_numpy(self.action[indices]), torch.from_numpy(self.reward[indices]), \
+                torch.from_numpy(self.next_observation[indices]).float(), \
+                torch.from_numpy(self.done[indices]), indices, weights
+
+        batch = torch.from_numpy(indices).to(self.device)
+        return self.observation[batch].float(), self.action[batch], self.reward[batch], \
+            self.next_observation[batch].float(), self.done[batch], indices, weights
 
     def update_priorities(self, indices, priorities):
-        for idx, priority in zip(indices, priorities):
-            self.priorities[idx] = priority
+        self.max_priority = max(self.max_priority, float(np.max(priorities)))
+        np.power(priorities, self.alpha, out=priorities)
+        self.tree.update_batch(indices + self.capacity - 1, priorities)
 
     def __len__(self):
-        return len(self.memory)
+        return self.size
+
+
+class SumTree:
+    """ A binary tree, stored as a flat array, in which each parent holds the sum of its two children
+
+    The last `capacity` nodes are the leaves and hold the priority of each transition,
+    which allows for sampling and updating priorities in O(log N).
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.tree = np.zeros(2 * capacity - 1, dtype=np.float32)
+
+    def total(self):
+        return self.tree[0]
+
+    def update(self, idx, priority):
+        """ Set the priority of leaf idx and recompute the sums of all its parents """
+        _update_tree(self.tree, idx, priority)
+
+    def update_batch(self, indices, priorities):
+        """ Set the priorities of multiple leaves at once and recompute the sums of all their parents """
+        _update_tree_batch(self.tree, indices, priorities)
+
+    def get(self, s):
+        """ Get, for each value in s, the leaf whose cumulative priority range contains it """
+        return _sample_tree(self.tree, np.asarray(s, dtype=np.float64), self.capacity)
+
+
+def _update_tree(tree, idx, priority):
+    tree[idx] = priority
+    while idx != 0:
+        idx = (idx - 1) // 2
+        tree[idx] = tree[2 * idx + 1] + tree[2 * idx + 2]
+
+
+def _update_tree_batch(tree, indices, priorities):
+    for k in range(len(indices)):
+        _update_tree(tree, indices[k], priorities[k])
+
+
+def _update_tree_batch_numpy(tree, indices, priorities):
+    """ Pure NumPy fallback of _update_tree_batch that recomputes the parents one level at a time.
+    A parent is recomputed again whenever one of its deeper children changed, so the root ends up last. """
+    tree[indices] = priorities
+    while len(indices):
+        indices = np.unique((indices[indices != 0] - 1) // 2)
+        tree[indices] = tree[2 * indices + 1] + tree[2 * indices + 2]
+
+
+def _sample_tree(tree, s_vec, capacity):
+    leaves = np.empty(len(s_vec), dtype=np.int64)
+    for k in range(len(s_vec)):
+        s = s_vec[k]
+        idx = 0
+        while idx < capacity - 1:
+            left = 2 * idx + 1
+            if s < tree[left]:
+                idx = left
+            else:
+                s -= tree[left]
+                idx = left + 1
+        leaves[k] = idx
+    return leaves
+
+
+def _sample_tree_numpy(tree, s_vec, capacity):
+    """ Pure NumPy fallback of _sample_tree that walks down the tree for all values at once.
+    Leaves that are reached before the last level (if capacity is not a power of 2) stay in place. """
+    idx = np.zeros(len(s_vec), dtype=np.int64)
+    for _ in range(int(np.ceil(np.log2(capacity)))):
+        internal = idx < capacity - 1
+        left = np.where(internal, 2 * idx + 1, idx)
+        go_right = internal & (s_vec >= tree[left])
+        s_vec = np.where(go_right, s_vec - tree[left], s_vec)
+        idx = np.where(go_right, left + 1, left)
+    return idx
+
+
+# Compile the tree walks if numba is installed, otherwise fall back to NumPy
+if njit is not None:
+    _update_tree = njit(_update_tree)
+    _update_tree_batch = njit(_update_tree_batch)
+    _sample_tree = njit(_sample_tree)
+else:
+    _update_tree_batch = _update_tree_batch_numpy
+    _sample_tree = _sample_tree_numpy
 
 
 class DuelingDDQN(nn.Module):
@@ -196,18 +371,11 @@ class DuelingDDQN(nn.Module):
         self.value_fc2 = nn.Linear(128, 1)
 
     def forward(self, observation):
-        feature = self.fc(observation)
-        advantage = self.adv_fc2(F.relu(self.adv_fc1(F.relu(feature))))
-        value = self.value_fc2(F.relu(self.value_fc1(F.relu(feature))))
-        return advantage + value - advantage.mean()
-
-    def act(self, observation, epsilon):
-        if random.random() > epsilon:
-            q_value = self.forward(observation)
-            action = q_value.max(1)[1].data[0].item()
-        else:
-            action = random.choice(list(range(self.action_dim)))
-        return action
+        feature = F.relu(self.fc(observation))
+        advantage = self.adv_fc2(F.relu_(self.adv_fc1(feature)))
+        value = self.value_fc2(F.relu_(self.value_fc1(feature)))
+        adv_mean = advantage.mean(dim=1, keepdim=True)
+        return value + advantage - adv_mean
 
     def __call__(self, *args, **kwargs) -> Any:
         """ Necessary to remove linting problem in class above: https://github.com/pytorch/pytorch/issues/24326 """
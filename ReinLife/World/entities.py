@@ -17,6 +17,8 @@ class Entity:
         The type of entity which follows .utils.EntityTypes
 
     """
+    __slots__ = ('i', 'j', 'coordinates', 'i_target', 'j_target', 'target_coordinates', 'entity_type')
+
     def __init__(self, coordinates: Collection[int], entity_type: int):
         assert len(coordinates) == 2
 
@@ -33,13 +35,15 @@ class Entity:
         """ Move to target location """
         self.i = self.i_target
         self.j = self.j_target
-        self.coordinates = [self.i, self.j]
+        self.coordinates[0] = self.i
+        self.coordinates[1] = self.j
 
     def update_target_location(self, i: int, j: int):
         """ Update coordinates of target location """
         self.i_target = i
         self.j_target = j
-        self.target_coordinates = [i, j]
+        self.target_coordinates[0] = i
+        self.target_coordinates[1] = j
 
 
 class Empty(Entity):
@@ -50,6 +54,8 @@ class Empty(Entity):
     coordinates : Collection[int]
         The i and j coordinates (2d) of the empty space.
     """
+    __slots__ = ('nutrition',)
+
     def __init__(self, coordinates: Collection[int]):
         super().__init__(coordinates, entities.empty)
         self.nutrition = 40
@@ -73,6 +79,8 @@ class BasicFood(Entity):
         The type of entity which follows .utils.EntityTypes
 
     """
+    __slots__ = ('_nutrition',)
+
     def __init__(self, coordinates: Collection[int], entity_type: int):
         super().__init__(coordinates, entity_type)
         self._nutrition = 0
@@ -94,6 +102,8 @@ class Food(BasicFood):
     coordinates : Collection[int]
         The i and j coordinates (2d) of the empty space.
     """
+    __slots__ = ()
+
     def __init__(self, coordinates: Collection[int]):
         super().__init__(coordinates, entities.food)
         self.nutrition = 40
@@ -108,6 +118,8 @@ class Poison(BasicFood):
     coordinates : Collection[int]
         The i and j coordinates (2d) of the empty space.
     """
+    __slots__ = ()
+
     def __init__(self, coordinates: Collection[int]):
         super().__init__(coordinates, entities.poison)
         self.nutrition = -40
@@ -122,6 +134,8 @@ class SuperFood(BasicFood):
     coordinates : Collection[int]
         The i and j coordinates (2d) of the empty space.
     """
+    __slots__ = ('age_multiplier',)
+
     def __init__(self, coordinates: Collection[int]):
         super().__init__(coordinates, entities.super_food)
         self.nutrition = 40
@@ -142,6 +156,10 @@ class Agent(Entity):
     gene : int, default None
         The gene of the Agent which represents to which family it belongs
     """
+    __slots__ = ('health', 'max_health', 'age', 'max_age', '_brain', '_learn_fn', 'reproduced', 'gene', 'action',
+                 'killed', 'inter_killed', 'intra_killed', 'ate_super_food', 'dead', 'state', 'state_prime', 'reward',
+                 'done', 'info', 'prob', 'fitness')
+
     def __init__(self, coordinates: Collection[int] = (None, None), brain: BasicBrain = None, gene: int = None):
         super().__init__(coordinates, entities.agent)
 
@@ -191,21 +209,47 @@ class Agent(Entity):
         self.done = done
         self.info = info
 
+    @property
+    def brain(self) -> BasicBrain:
+        return self._brain
+
+    @brain.setter
+    def brain(self, brain: BasicBrain):
+        """ Set the brain and resolve once how its learn method should be called
+
+        The plain function is stored instead of a bound method, which would make the agent reference itself
+        and could then only be freed by the cyclic garbage collector.
+        """
+        self._brain = brain
+
+        if brain is None:
+            self._learn_fn = None
+        elif brain.method == "PPO":
+            self._learn_fn = Agent._learn_with_prob
+        elif brain.method in ["DQN", "A2C", "PERDQN"]:
+            self._learn_fn = Agent._learn_without_kwargs
+        else:
+            self._learn_fn = Agent._learn_with_kwargs
+
     def learn(self, **kwargs):
         """ Make sure to """
         if self.age > 1:
-            if self.brain.method == "PPO":
-                self.brain.learn(age=self.age, dead=self.dead, action=self.action, state=self.state, reward=self.reward,
-                                 state_prime=self.state_prime, done=self.done, prob=self.prob)
-            elif self.brain.method == "DRQN":
-                self.brain.learn(age=self.age, dead=self.dead, action=self.action, state=self.state, reward=self.reward,
-                                 state_prime=self.state_prime, done=self.done, **kwargs)
-            elif self.brain.method in ["DQN", "A2C", "PERDQN"]:
-                self.brain.learn(age=self.age, dead=self.dead, action=self.action, state=self.state, reward=self.reward,
-                                 state_prime=self.state_prime, done=self.done)
-            else:
-                self.brain.learn(age=self.age, dead=self.dead, action=self.action, state=self.state, reward=self.reward,
-                                 state_prime=self.state_prime, done=self.done, **kwargs)
+            self._learn_fn(self, **kwargs)
+
+    def _learn_with_prob(self, **kwargs):
+        """ Learn for brains that need the probability of the chosen action (PPO) """
+        self.brain.learn(age=self.age, dead=self.dead, action=self.action, state=self.state, reward=self.reward,
+                         state_prime=self.state_prime, done=self.done, prob=self.prob)
+
+    def _learn_without_kwargs(self, **kwargs):
+        """ Learn for brains that do not accept additional keyword arguments (DQN, A2C, PERDQN) """
+        self.brain.learn(age=self.age, dead=self.dead, action=self.action, state=self.state, reward=self.reward,
+                         state_prime=self.state_prime, done=self.done)
+
+    def _learn_with_kwargs(self, **kwargs):
+        """ Learn for brains that also use keyword arguments such as n_epi (DRQN, D3QN, PERD3QN) """
+        self.brain.learn(age=self.age, dead=self.dead, action=self.action, state=self.state, reward=self.reward,
+                         state_prime=self.state_prime, done=self.done, **kwargs)
 
     def mutate_brain(self):
         """ Applies gaussian noise to all layers in a model """
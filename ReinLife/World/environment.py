@@ -388,18 +388,31 @@ class Environment:
         genes_grid : np.array
             A grid in which the gene value of all agents is displayed
         """
+        entity_types = self.grid.entity_types
+
+        # Column-wise stats of all agents so that they can be scattered into the grids at once
+        agents_i = np.array([agent.i for agent in self.agents], dtype=np.int64)
+        agents_j = np.array([agent.j for agent in self.agents], dtype=np.int64)
+        health = np.array([agent.health for agent in self.agents], dtype=np.float64)
+        max_health = np.array([agent.max_health for agent in self.agents], dtype=np.float64)
+        dead = np.array([agent.dead for agent in self.agents], dtype=bool)
+        genes = np.array([agent.gene for agent in self.agents], dtype=np.int64)
+
         # Food
-        vectorize = np.vectorize(lambda obj: self._get_food(obj))
-        food_grid = vectorize(self.grid.grid)
+        food_grid = np.zeros(entity_types.shape, dtype=np.float64)
+        food_grid[entity_types == self.entities.food] = .5
+        food_grid[entity_types == self.entities.super_food] = 1.
+        food_grid[entity_types == self.entities.poison] = -1.
+        food_grid[agents_i, agents_j] = np.where(health < 0, 1., 0.)
 
-        # health
-        vectorize = np.vectorize(
-            lambda obj: obj.health / obj.max_health if obj.entity_type == self.entities.agent else -1)
-        health_grid = vectorize(self.grid.grid)
+        # Health, integer (i.e., truncated) unless the top-left location holds an agent
+        health_dtype = np.float64 if entity_types[0, 0] == self.entities.agent else np.int64
+        health_grid = np.full(entity_types.shape, -1, dtype=health_dtype)
+        health_grid[agents_i, agents_j] = health / max_health
 
         # Genes
-        vectorize = np.vectorize(lambda obj: self._get_genes(obj))
-        genes_grid = vectorize(self.grid.grid)
+        genes_grid = np.full(entity_types.shape, -2, dtype=np.int64)
+        genes_grid[agents_i, agents_j] = np.where(dead, genes, -2)
 
         return food_grid, health_grid, genes_grid
 
@@ -429,32 +442,6 @@ class Environment:
 
         return common_genes
 
-    def _get_food(self, obj: Entity or Agent) -> float:
-        """ Lambda function to return .5 for food, 1. for super food, -1 for poison and 0 for everything else """
-        if obj.entity_type == self.entities.food:
-            return .5
-        elif obj.entity_type == self.entities.super_food:
-            return 1.
-        elif obj.entity_type == self.entities.poison:
-            return -1.
-        elif obj.entity_type == self.entities.agent:
-            if obj.health < 0:
-                return 1.
-            else:
-                return 0.
-        else:
-            return 0.
-
-    def _get_genes(self, obj: Entity or Agent) -> int:
-        """ Lambda function to return gene value for each entity, -2 otherwise """
-        if obj.entity_type == self.entities.agent:
-            if not obj.dead:
-                return -2
-            else:
-                return obj.gene
-        else:
-            return -2
-
     def _add_agent(self,
                    coordinates: Collection[int] = None,
                    brain: BasicBrain = None,
@@ -777,8 +764,7 @@ class Environment:
 
     def _update_agent_position(self, agent: Agent):
         """ Update position of an agent in the grid """
-        self.grid.grid[agent.i, agent.j] = Empty((agent.i, agent.j))
-        self.grid.grid[agent.i_target, agent.j_target] = agent
+        self.grid.update(agent.i, agent.j, Empty((agent.i, agent.j)), agent.i_target, agent.j_target, agent)
         agent.move()
 
     def _update_agents_state(self):
@@ -796,4 +782,4 @@ class Environment:
         """ Remove dead agent from grid """
         for agent in self.agents:
             if agent.dead:
-                self.grid.grid[agent.i, agent.j] = Food((agent.i, agent.j))
+                self.grid.set(agent.i, agent.j, Food)
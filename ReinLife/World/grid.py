@@ -17,6 +17,15 @@ class Grid:
     heigth : int
         The height of the grid
 
+    Attributes:
+    -----------
+    grid : np.ndarray
+        An object array holding the entity at each location
+
+    entity_types : np.ndarray
+        An integer array, kept in sync with grid, holding the entity type at each location. This allows
+        spatial queries (e.g., all locations of food) to be vectorized instead of looping over all entities.
+
     """
 
     def __init__(self, width: int, height: int):
@@ -28,6 +37,7 @@ class Grid:
         self.entity_type = EntityTypes
 
         self.grid = np.zeros([self.height, self.width], dtype=object)
+        self.entity_types = np.full([self.height, self.width], self.entity_type.empty, dtype=np.int8)
         for i in range(self.height):
             for j in range(self.width):
                 self.grid[i, j] = Entity((i, j), entity_type=self.entity_type.empty)
@@ -47,20 +57,18 @@ class Grid:
         assert i >= 0 and i < self.height
         assert j >= 0 and j < self.width
         self.grid[i, j] = entity((i, j), **kwargs)
+        self.entity_types[i, j] = self.grid[i, j].entity_type
         return self.grid[i, j]
 
     def get_numpy(self, entity_type: int = None) -> np.array:
         """ Get a numpy representation of the grid """
         if entity_type:
-            vectorized = np.vectorize(lambda obj: obj.entity_type == entity_type)
-        else:
-            vectorized = np.vectorize(lambda obj: obj.entity_type)
-        return vectorized(self.grid)
+            return self.entity_types == entity_type
+        return self.entity_types.copy()
 
     def get_entities(self, entity_type: int = None) -> List[Entity]:
         """ Get all entities of a specific type """
-        grid = self.get_numpy()
-        coordinates = np.where(grid == entity_type)
+        coordinates = np.where(self.entity_types == entity_type)
         coordinates = [(i, j) for i, j in zip(coordinates[0], coordinates[1])]
         entities = [self.grid[coordinate] for coordinate in coordinates]
 
@@ -68,14 +76,14 @@ class Grid:
 
     def set_random(self, entity: Type[Entity], p: float, **kwargs) -> np.array:
         """ Set an entity at a random location iff there is space """
-        grid = self.get_numpy()
-        indices = np.where(grid == self.entity_type.empty)
+        indices = np.where(self.entity_types == self.entity_type.empty)
 
         try:
             random_index = np.random.randint(0, len(indices[0]))
             i, j = indices[0][random_index], indices[1][random_index]
             if np.random.random() < p:
                 self.grid[i, j] = entity((i, j), **kwargs)
+                self.entity_types[i, j] = self.grid[i, j].entity_type
                 return self.grid[i, j]
             else:
                 return None
@@ -85,7 +93,9 @@ class Grid:
     def update(self, i: int, j: int, entity_1: Type[Entity], k: int, l: int, entity_2: Type[Entity]):
         """ Update location i, j with entity_1 and k, l with entity_2 """
         self.grid[i, j] = entity_1
+        self.entity_types[i, j] = entity_1.entity_type
         self.grid[k, l] = entity_2
+        self.entity_types[k, l] = entity_2.entity_type
 
     def fov(self, i: int, j: int, dist: int, grid: np.ndarray = None) -> np.ndarray:
         """ Get the fov (also through walls) for location i, j with distance dist